@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import logging
+import time
+import weakref
+from collections.abc import Awaitable, Callable
+
+import mcp.types as types
+from pydantic import AnyUrl
+
+logger = logging.getLogger("catalog-resources")
+
+# Serves catalog queries as MCP resources, and tells subscribed clients when they change.
+#
+# resources maps each resource uri to its name, description and catalog path, and fetch gets
+# a catalog path as text. One poll loop per server checks the resources that have subscribers
+# every interval seconds, or sooner when trigger() is called (for example by a webhook), but
+# never more than once every min_interval seconds. It sends resources/updated to the
+# subscribers of the ones whose content changed. So the upstream poll volume doesn't depend
+# on how many clients are subscribed, and clients only read a resource again when it changed.
+class CatalogWatcher:
+    def __init__(
+        self,
+        resources: dict[str, tuple[str, str, str]],
+        fetch: Callable[[str], Awaitable[str]],
+        interval: float = 30,
+        min_interval: float = 5,
+    ):
+        self.resources = resources
+        self.fetch = fetch
+        self.interval = interval
+        self.min_interval = min_interval
+        self._contents: dict[str, tuple[float, str, str]] = {}
+        # The digest each resource had when poll() last looked at it. Only poll() updates it,
+        # because read() also refreshes _contents and would otherwise hide a change.
+        self._notified: dict[str, str] = {}
+        # Sessions go away without unsubscribing when clients disconnect, so don't keep them alive
+        self._subscribers: dict[str, weakref.WeakSet] = {uri: weakref.WeakSet() for uri in resources}
+        self._wakeup = asyncio.Event()
+
+    def list_resources(self) -> list[types.Resource]:
+        return [
+            types.Resource(uri=AnyUrl(uri), name=name, description=description, mimeType="application/json")
+            for uri, (name, description, _) in self.resources.items()
+        ]
+
+    # Reads are answered from the last poll while it's recent, so they don't hit the catalog either
+    async def read(self, uri: str) -> str:
+        self._check(uri)
+        cached = self._contents.get(uri)
+        if cached and time.monotonic() - cached[0] < self.interval:
+            return cached[2]
+        text = await self.fetch(self.resources[uri][2])
+        self._store(uri, text)
+        return text
+
+    def subscribe(self, uri: str, session) -> None:
+        self._check(uri)
+        self._subscribers[uri].add(session)
+        # If the resource was already read, changes from that content on are notified
+        if uri in self._contents:
+            self._notified.setdefault(uri, self._contents[uri][1])
+        logger.info(f"Subscribed to {uri}, {len(self._subscribers[uri])} subscriber(s)")
+
+    def unsubscribe(self, uri: str, session) -> None:
+        self._check(uri)
+        self._subscribers[uri].discard(session)
+
+    def trigger(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        logger.info(f"Watching the catalog for changes every {self.interval} seconds")
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Polling the catalog failed: {e!r}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            # Triggers that arrive faster than min_interval are merged into one poll, so
+            # however often trigger() is called the catalog isn't polled back to back
+            await asyncio.sleep(max(0, started + self.min_interval - loop.time()))
+            self._wakeup.clear()
+
+    async def poll(self) -> None:
+        for uri, subscribers in self._subscribers.items():
+            if not subscribers:
+                continue
+            digest = self._store(uri, await self.fetch(self.resources[uri][2]))
+            previous = self._notified.get(uri)
+            self._notified[uri] = digest
+            if previous is None or previous == digest:
+                continue
+            logger.info(f"{uri} changed, notifying {len(subscribers)} subscriber(s)")
+            for session in list(subscribers):
+                try:
+                    await session.send_resource_updated(AnyUrl(uri))
+                except Exception as e:
+                    logger.info(f"Dropping a subscriber to {uri}: {e!r}")
+                    subscribers.discard(session)
+
+    def _store(self, uri: str, text: str) -> str:
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        self._contents[uri] = (time.monotonic(), digest, text)
+        return digest
+
+    def _check(self, uri: str) -> None:
+        if uri not in self.resources:
+            raise ValueError(f"Unknown resource: {uri}")
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import logging
+import math
+import re
+from collections import Counter
+from typing import Callable
+
+logger = logging.getLogger("catalog-search")
+
+# BM25 tuning constants, the usual defaults
+BM25_K1 = 1.2
+BM25_B  = 0.75
+
+# A query term that isn't in the index is matched against indexed terms that share at least
+# this fraction of their trigrams, so that "signup" still finds "sign-up" and typos still match
+TRIGRAM_THRESHOLD = 0.5
+
+# How much the embedding (cosine) score counts for when an embedding function is configured
+SEMANTIC_WEIGHT = 0.5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def trigrams(term: str) -> set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def entity_key(entity: dict) -> str:
+    metadata = entity.get("metadata", {})
+    return f'{entity.get("kind", "")}:{metadata.get("namespace", "default")}/{metadata.get("name", "")}'.lower()
+
+# The text that is searched: name, title, description, tags and link titles.
+# The name and title are repeated so that a match there counts for more than one in the description.
+def entity_text(entity: dict) -> str:
+    metadata = entity.get("metadata", {})
+    name = metadata.get("name") or ""
+    title = metadata.get("title") or ""
+    parts = [name, name, title, title, metadata.get("description") or ""]
+    parts.extend(metadata.get("tags") or [])
+    parts.extend(link.get("title") or "" for link in metadata.get("links") or [])
+    return " ".join(parts)
+
+# A search index over catalog entities: BM25 over the entity text, with trigram matching for
+# query terms that aren't in the index, and optionally cosine similarity over embeddings.
+#
+# update() takes the full list of entities each time, but only the entities that were added,
+# changed or removed since the last update are (re)indexed and (re)embedded.
+#
+# embed is an optional function that turns a list of texts into a list of vectors. NumPy is
+# only imported when it is set.
+class CatalogSearchIndex:
+    def __init__(self, embed: Callable[[list[str]], list[list[float]]] | None = None):
+        self.embed = embed
+        self.entities: dict[str, dict] = {}
+        self._hashes: dict[str, str] = {}
+        self._term_freqs: dict[str, Counter] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._total_length = 0
+        self._doc_freqs: Counter = Counter()
+        # term -> keys of the entities that contain it
+        self._postings: dict[str, set[str]] = {}
+        # trigram -> terms that contain it
+        self._trigrams: dict[str, set[str]] = {}
+        self._vectors: dict = {}
+        self._matrix = None
+        self._matrix_keys: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def update(self, entities: list[dict]) -> tuple[int, int, int]:
+        return self.apply_update(self.prepare_update(entities))
+
+    # The slow part of update(): finding what changed and embedding it. It doesn't touch the
+    # index, so it can run in a thread while searches are still answered from the index as it
+    # is. Only one update should be prepared and applied at a time.
+    def prepare_update(self, entities: list[dict]) -> tuple[list, list, dict]:
+        current = {entity_key(entity): entity for entity in entities}
+        removed = [key for key in self.entities if key not in current]
+        changed = []
+        for key, entity in current.items():
+            digest = hashlib.sha1(json.dumps(entity, sort_keys=True).encode()).hexdigest()
+            if self._hashes.get(key) != digest:
+                changed.append((key, entity, digest))
+
+        # Embed before touching the index, so that if embedding fails nothing is recorded as
+        # indexed and the next update tries the same entities again
+        vectors = {}
+        if self.embed is not None and changed:
+            embeddings = self.embed([entity_text(entity) for _, entity, _ in changed])
+            vectors = self._normalize({key: vector for (key, _, _), vector in zip(changed, embeddings)})
+        return removed, changed, vectors
+
+    def apply_update(self, prepared: tuple[list, list, dict]) -> tuple[int, int, int]:
+        removed, changed, vectors = prepared
+        for key in removed:
+            self._remove(key)
+        added = 0
+        for key, entity, digest in changed:
+            if key in self.entities:
+                self._remove(key)
+            else:
+                added += 1
+            self._add(key, entity, digest)
+        self._vectors.update(vectors)
+        if removed or changed:
+            self._matrix = None
+
+        logger.info(f"Updated the search index: {added} added, {len(changed) - added} changed, {len(removed)} removed")
+        return added, len(changed) - added, len(removed)
+
+    # query_vector is the embedding of the query, if it was already computed
+    def search(
+        self, query: str, limit: int = 5, kinds: list[str] | None = None, query_vector=None
+    ) -> list[tuple[float, dict]]:
+        if not self.entities:
+            return []
+        scores = self._bm25_scores(query)
+
+        if self.embed is not None:
+            lexical_max = max(scores.values(), default=0) or 1
+            combined = {key: (1 - SEMANTIC_WEIGHT) * score / lexical_max for key, score in scores.items()}
+            if query_vector is None:
+                query_vector = self.embed([query])[0]
+            for key, similarity in self._cosine_scores(query_vector).items():
+                combined[key] = combined.get(key, 0) + SEMANTIC_WEIGHT * similarity
+            scores = combined
+
+        if kinds:
+            kinds = {kind.lower() for kind in kinds}
+            scores = {key: score for key, score in scores.items()
+                      if self.entities[key].get("kind", "").lower() in kinds}
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(score, self.entities[key]) for key, score in best if score > 0]
+
+    def _add(self, key: str, entity: dict, digest: str) -> None:
+        terms = Counter(tokenize(entity_text(entity)))
+        self.entities[key] = entity
+        self._hashes[key] = digest
+        self._term_freqs[key] = terms
+        length = sum(terms.values())
+        self._doc_lengths[key] = length
+        self._total_length += length
+        for term in terms:
+            self._doc_freqs[term] += 1
+            if term not in self._postings:
+                self._postings[term] = set()
+                for trigram in trigrams(term):
+                    self._trigrams.setdefault(trigram, set()).add(term)
+            self._postings[term].add(key)
+
+    def _remove(self, key: str) -> None:
+        del self.entities[key]
+        del self._hashes[key]
+        self._total_length -= self._doc_lengths.pop(key)
+        for term in self._term_freqs.pop(key):
+            self._doc_freqs[term] -= 1
+            self._postings[term].discard(key)
+            if not self._postings[term]:
+                del self._doc_freqs[term]
+                del self._postings[term]
+                for trigram in trigrams(term):
+                    terms = self._trigrams[trigram]
+                    terms.discard(term)
+                    if not terms:
+                        del self._trigrams[trigram]
+        self._vectors.pop(key, None)
+
+    # Query terms that aren't indexed are replaced by the indexed terms with similar trigrams,
+    # weighted by how similar they are
+    def _expand_term(self, term: str) -> list[tuple[str, float]]:
+        if term in self._postings:
+            return [(term, 1.0)]
+        query_trigrams = trigrams(term)
+        shared = Counter()
+        for trigram in query_trigrams:
+            for candidate in self._trigrams.get(trigram, ()):
+                shared[candidate] += 1
+        matches = []
+        for candidate, count in shared.items():
+            similarity = count / len(query_trigrams | trigrams(candidate))
+            if similarity >= TRIGRAM_THRESHOLD:
+                matches.append((candidate, similarity))
+        return matches
+
+    def _bm25_scores(self, query: str) -> dict[str, float]:
+        count = len(self.entities)
+        average_length = self._total_length / count or 1
+        scores: dict[str, float] = {}
+        for query_term in set(tokenize(query)):
+            for term, weight in self._expand_term(query_term):
+                doc_freq = self._doc_freqs[term]
+                idf = math.log(1 + (count - doc_freq + 0.5) / (doc_freq + 0.5))
+                for key in self._postings[term]:
+                    freq = self._term_freqs[key][term]
+                    norm = freq + BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[key] / average_length)
+                    scores[key] = scores.get(key, 0) + weight * idf * freq * (BM25_K1 + 1) / norm
+        return scores
+
+    def _normalize(self, vectors: dict) -> dict:
+        import numpy as np
+        normalized = {}
+        for key, vector in vectors.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            normalized[key] = vector / norm if norm else vector
+        return normalized
+
+    # One matrix-vector product over the normalized embeddings of every entity
+    def _cosine_scores(self, query_vector) -> dict[str, float]:
+        import numpy as np
+        if not self._vectors:
+            return {}
+        if self._matrix is None:
+            self._matrix_keys = list(self._vectors)
+            self._matrix = np.stack([self._vectors[key] for key in self._matrix_keys])
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm:
+            query_vector = query_vector / norm
+        similarities = self._matrix @ query_vector
+        return dict(zip(self._matrix_keys, similarities.tolist()))
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("fetch-many")
+
+USER_AGENT = "MCP Test Server (github.com/modelcontextprotocol/python-sdk)"
+
+# Turns HTML into its visible text, dropping scripts, styles and markup
+class _TextExtractor(HTMLParser):
+    SKIP_TAGS = {"script", "style", "noscript", "template", "head"}
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "pre"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+def html_to_text(html: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    lines = (" ".join(line.split()) for line in "".join(extractor.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+# Limits how many requests are open to each host at once, and optionally how many are
+# started per second, so that fetching many links on one site doesn't hammer it
+class HostLimiter:
+    def __init__(self, concurrency: int = 4, rate: float | None = None):
+        self.concurrency = concurrency
+        self.interval = 1 / rate if rate else 0
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    def semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[host]
+
+    async def wait_turn(self, host: str) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        # Reserve the next start slot before sleeping, so that waiters are spaced out
+        start = max(loop.time(), self._next_start.get(host, 0))
+        self._next_start[host] = start + self.interval
+        await asyncio.sleep(start - loop.time())
+
+async def fetch_one(
+    client, url: str, limiter: HostLimiter, semaphore: asyncio.Semaphore,
+    max_bytes: int, content_types: list[str] | None, extract_text: bool,
+) -> dict:
+    result = {"url": url}
+    host = urlsplit(url).netloc.lower()
+    async with limiter.semaphore(host), semaphore:
+        await limiter.wait_turn(host)
+        start = time.monotonic()
+        try:
+            async with client.stream("GET", url) as response:
+                content_type = response.headers.get("content-type", "")
+                result["status"] = response.status_code
+                result["contentType"] = content_type
+                if content_types and not any(content_type.startswith(allowed) for allowed in content_types):
+                    result["skipped"] = "content type not allowed"
+                    return result
+
+                # Stop reading once max_bytes have arrived, instead of downloading the whole body
+                body = bytearray()
+                if max_bytes > 0:
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk)
+                        if len(body) >= max_bytes:
+                            result["truncated"] = True
+                            del body[max_bytes:]
+                            break
+                result["bytes"] = len(body)
+                if body:
+                    text = body.decode(response.encoding or "utf-8", errors="replace")
+                    if extract_text and "html" in content_type:
+                        text = html_to_text(text)
+                    result["text"] = text
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            result["seconds"] = round(time.monotonic() - start, 3)
+    return result
+
+# Fetches the urls concurrently, and yields each result as soon as it is complete. A result
+# always has the url, and then either an error or the status, content type and (up to
+# max_bytes of) the body as text. max_bytes=0 only checks the status, which is enough for
+# link checking. content_types, if given, are the content type prefixes to read the body of.
+async def fetch_many(
+    urls: list[str],
+    concurrency: int = 16,
+    per_host_concurrency: int = 4,
+    per_host_rate: float | None = None,
+    max_bytes: int = 1_000_000,
+    content_types: list[str] | None = None,
+    extract_text: bool = False,
+    timeout: float = 10,
+) -> AsyncIterator[dict]:
+    import httpx
+
+    urls = list(dict.fromkeys(urls))
+    limiter = HostLimiter(per_host_concurrency, per_host_rate)
+    # The semaphore caps the requests in flight, so none of them wait (and time out) on the
+    # connection pool
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"User-Agent": USER_AGENT}
+    logger.info(f"Fetching {len(urls)} urls")
+
+    async with httpx.AsyncClient(follow_redirects=True, headers=headers, limits=limits, timeout=timeout) as client:
+        tasks = [
+            asyncio.create_task(fetch_one(client, url, limiter, semaphore, max_bytes, content_types, extract_text))
+            for url in urls
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -13,6 +13,9 @@ CHAT_URI = "/v1/chat/completions"
 
 server = Server("granite3-model")
 
+# Set by main when the server is started with --backend local
+local_backend = None
+
 # Utility method to convert a PromptMessage into a json array in this format:
 #{
 #    "model": "ibm-granite-8b-code-instruct",
@@ -82,6 +85,21 @@ async def chat_with_granite3_model(
         response.raise_for_status()
         return [types.TextContent(type="text", text=response.text)]
 
+# Utility method to chat with the in-process model, see granite_local_backend.py.
+# The prompt arrives as the JSON form of a GetPromptResult.
+async def chat_with_local_granite3_model(
+    arguments: dict
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for message in arguments["prompt"]["messages"]:
+        if message["role"] == "user":
+            messages.append({"role": "user", "content": message["content"]["text"]})
+
+    logger.info(f"Preparing to chat with the local model with messages length {len(messages)}")
+    text = await local_backend.generate(messages)
+    return [types.TextContent(type="text", text=text)]
+
 # Utility method to create the messages for the prompt
 def create_messages(
     topic: str, context: str | None = None
@@ -108,27 +126,30 @@ def create_messages(
     logger.info("Returning messages: ".join(map(str, messages)))
     return messages
 
+# The prompt and tool schemas never change, so build them once instead of on every list call
+PROMPTS = [
+    types.Prompt(
+        name="chat-prompt",
+        description="A simple prompt with optional context and chat message",
+        arguments=[
+            types.PromptArgument(
+                name="context",
+                description="Additional context to consider",
+                required=False,
+            ),
+            types.PromptArgument(
+                name="topic",
+                description="The chat message to send to the model",
+                required=True
+            )
+        ]
+    ),
+]
+
 # Add prompt capabilities
 @server.list_prompts()
 async def handle_list_prompts() -> list[types.Prompt]:
-    return [
-        types.Prompt(
-            name="chat-prompt",
-            description="A simple prompt with optional context and chat message",
-            arguments=[
-                types.PromptArgument(
-                    name="context",
-                    description="Additional context to consider",
-                    required=False,
-                ),
-                types.PromptArgument(
-                    name="topic",
-                    description="The chat message to send to the model",
-                    required=True
-                )
-            ]
-        ),
-    ]
+    return PROMPTS
 
 @server.get_prompt()
 async def handle_get_prompt(
@@ -153,7 +174,15 @@ async def handle_get_prompt(
 async def call_tool(
     name: str, arguments: dict
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
-        
+
+    # The local backend doesn't need a url or apiKey
+    if local_backend is not None:
+        if name != "chat":
+            raise ValueError(f'Unknown tool: {name}')
+        if "prompt" not in arguments:
+            raise ValueError("Missing required argument 'prompt'")
+        return await chat_with_local_granite3_model(arguments)
+
     # All of the tools require the url
     if "url" not in arguments:
         raise ValueError("Missing required argument 'url'")
@@ -178,47 +207,118 @@ async def call_tool(
     else:
         raise ValueError(f'Unknown tool: {name}')
 
-@server.list_tools()
-async def list_tools() -> list[types.Tool]:
-    return [
-        types.Tool(
-            name="chat",
-            description="Sends a chat request to the model",
-            inputSchema={
-                "type": "object",
-                "required": ["url","apiKey"],
-                "properties": {
-                    "url": {
-                        "type": "string",
-                        "description": "URL to fetch",
-                    },
-                    "apiKey": {
-                        "type": "string",
-                        "description": "API key to use in the Authorization: Bearer header",
-                    },
-                    "model": {
-                        "type": "string",
-                        "description": "The name of the model, for example granite3-dense:8b",
-                    }
+PROMPT_SCHEMA = {
+    "type": "object",
+    "description": "The result of get_prompt for chat-prompt, with the messages to send to the model",
+}
+
+TOOLS = [
+    types.Tool(
+        name="chat",
+        description="Sends a chat request to the model",
+        inputSchema={
+            "type": "object",
+            "required": ["url","apiKey","prompt"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                },
+                "apiKey": {
+                    "type": "string",
+                    "description": "API key to use in the Authorization: Bearer header",
+                },
+                "model": {
+                    "type": "string",
+                    "description": "The name of the model, for example granite3-dense:8b",
                 },
+                "prompt": PROMPT_SCHEMA,
             },
-        )
-    ]
+        },
+    )
+]
+
+# With --backend local the model runs in this process, so there is no url, apiKey or model to choose
+LOCAL_TOOLS = [
+    types.Tool(
+        name="chat",
+        description="Sends a chat request to the model",
+        inputSchema={
+            "type": "object",
+            "required": ["prompt"],
+            "properties": {
+                "prompt": PROMPT_SCHEMA,
+            },
+        },
+    )
+]
+
+@server.list_tools()
+async def list_tools() -> list[types.Tool]:
+    return LOCAL_TOOLS if local_backend is not None else TOOLS
          
 @click.group()
 def cli():
     pass
 
 @cli.command()
-@click.option("--port", default=8000, help="Port to listen on for SSE")
+@click.option("--port", default=8000, help="Port to listen on for SSE or HTTP")
 @click.option(
     "--transport",
-    type=click.Choice(["stdio", "sse"]),
+    type=click.Choice(["stdio", "sse", "http"]),
     default="stdio",
     help="Transport type",
 )
-def main(port: int, transport: str) -> int:
-    logger.info(f"Starting up granite3-model server using transport: {transport}")
+@click.option(
+    "--stateless",
+    is_flag=True,
+    default=False,
+    help="For the http transport, don't keep any session state between requests",
+)
+@click.option(
+    "--json-response",
+    is_flag=True,
+    default=False,
+    help="For the http transport, return plain JSON responses instead of SSE streams",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["remote", "local"]),
+    default="remote",
+    help="Send chat requests to the inference server at the url argument, or run the model in this process",
+)
+@click.option(
+    "--quantize",
+    type=click.Choice(["none", "bf16", "int8"]),
+    default="none",
+    help="For the local backend, the precision to run the model in (int8 is cpu only)",
+)
+@click.option(
+    "--device",
+    type=click.Choice(["cpu", "cuda", "mps"]),
+    default=None,
+    help="For the local backend, the device to run the model on, defaults to the best one available",
+)
+@click.option("--compile", "compile_model", is_flag=True, default=False, help="For the local backend, use torch.compile")
+@click.option("--max-batch-size", default=8, help="For the local backend, the most requests to generate together")
+@click.option("--max-wait-ms", default=20, help="For the local backend, how long to wait for more requests to batch")
+def main(port: int, transport: str, stateless: bool, json_response: bool,
+         backend: str, quantize: str, device: str | None, compile_model: bool, max_batch_size: int, max_wait_ms: int) -> int:
+    global local_backend
+    logger.info(f"Starting up granite3-model server using transport: {transport} and backend: {backend}")
+
+    if backend == "local":
+        from granite_local_backend import GraniteLocalBackend
+        try:
+            local_backend = GraniteLocalBackend(
+                device=device,
+                quantize=quantize,
+                compile=compile_model,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+            )
+        except ValueError as e:
+            raise click.UsageError(str(e))
 
     if transport == "sse":
         from mcp.server.sse import SseServerTransport
@@ -249,6 +349,45 @@ def main(port: int, transport: str) -> int:
 
         import uvicorn
 
+        uvicorn.run(starlette_app, host="0.0.0.0", port=port)
+    elif transport == "http":
+        import contextlib
+        from collections.abc import AsyncIterator
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+        from starlette.applications import Starlette
+        from starlette.routing import Mount
+        from starlette.types import Receive, Scope, Send
+        logger.info(f"Starting up streamable http server on port: {port} (stateless: {stateless})")
+
+        # In stateless mode every request gets a fresh transport, so any replica
+        # can answer any request and no sticky routing is needed.
+        session_manager = StreamableHTTPSessionManager(
+            app=server,
+            event_store=None,
+            json_response=json_response,
+            stateless=stateless,
+        )
+
+        async def handle_streamable_http(
+            scope: Scope, receive: Receive, send: Send
+        ) -> None:
+            await session_manager.handle_request(scope, receive, send)
+
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app: Starlette) -> AsyncIterator[None]:
+            async with session_manager.run():
+                yield
+
+        starlette_app = Starlette(
+            debug=True,
+            routes=[
+                Mount("/mcp", app=handle_streamable_http),
+            ],
+            lifespan=lifespan,
+        )
+
+        import uvicorn
+
         uvicorn.run(starlette_app, host="0.0.0.0", port=port)
     else:
         from mcp.server.stdio import stdio_server
@@ -0,0 +1,227 @@
+import asyncio
+import copy
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger("granite-local-backend")
+
+MODEL_PATH = "ibm-granite/granite-3.0-8b-instruct"
+
+def check_quantize(quantize: str, device: str) -> None:
+    if quantize == "int8" and device != "cpu":
+        raise ValueError(f"int8 quantization is only supported on the cpu device, not {device}")
+
+# In-process Granite inference for granite3_model_server.py --backend local, based on
+# granite-from-hf.py. The model is loaded once, on the first request, and concurrent
+# requests are gathered into batches: the first request in a batch waits up to max_wait_ms
+# for up to max_batch_size - 1 others, then they are padded and run through a single
+# model.generate call.
+#
+# The leading system messages that every request in a batch shares (with
+# granite3_model_server.py, its system prompt) are a prefix: its KV cache is computed once
+# and reused by later batches, so only each request's own context and question have to
+# be run through the model. Those are left padded to the same length.
+#
+# torch and transformers are imported in load(), so that importing this module stays cheap.
+class GraniteLocalBackend:
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        device: str | None = None,
+        quantize: str = "none",
+        compile: bool = False,
+        max_batch_size: int = 8,
+        max_wait_ms: int = 20,
+        max_new_tokens: int = 256,
+        prefix_cache_size: int = 8,
+    ):
+        if quantize not in ("none", "bf16", "int8"):
+            raise ValueError(f"Unknown quantization: {quantize}")
+        if device is not None:
+            check_quantize(quantize, device)
+        self.model_path = model_path
+        self.device = device
+        self.quantize = quantize
+        self.compile = compile
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_new_tokens = max_new_tokens
+        self.prefix_cache_size = prefix_cache_size
+
+        self.model = None
+        self.tokenizer = None
+        self._prefix_caches: OrderedDict = OrderedDict()
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    def load(self) -> None:
+        if self.model is not None:
+            return
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        # Make use of a GPU or MPS (Apple) if one is available, same as granite-from-hf.py
+        if self.device is None:
+            has_mps = torch.backends.mps.is_built()
+            self.device = "mps" if has_mps else "cuda" if torch.cuda.is_available() else "cpu"
+        # Checked before loading, since loading the model is by far the slowest part
+        check_quantize(self.quantize, self.device)
+        logger.info(f"Loading {self.model_path} on device: {self.device} (quantize: {self.quantize}, compile: {self.compile})")
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        # Batches are left padded so that every prompt ends right where generation starts
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        dtype = torch.bfloat16 if self.quantize == "bf16" else torch.float32
+        if self.device == "cpu":
+            model = AutoModelForCausalLM.from_pretrained(self.model_path, torch_dtype=dtype)
+        else:
+            model = AutoModelForCausalLM.from_pretrained(self.model_path, torch_dtype=dtype, device_map=self.device)
+        model.eval()
+
+        if self.quantize == "int8":
+            # Dynamic quantization keeps the weights of the linear layers in int8 and
+            # quantizes the activations on the fly, which is what makes CPU inference usable
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if self.compile:
+            model.forward = torch.compile(model.forward)
+
+        self.tokenizer = tokenizer
+        self.model = model
+
+    async def generate(self, messages: list[dict], max_new_tokens: int | None = None) -> str:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run_batches())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((messages, max_new_tokens or self.max_new_tokens, future))
+        return await future
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                if self.model is None:
+                    await asyncio.to_thread(self.load)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # Requests can only share a generate call if they have the same max_new_tokens
+            groups: dict = {}
+            for messages, max_new_tokens, future in batch:
+                groups.setdefault(max_new_tokens, []).append((messages, future))
+
+            # Only one generate call runs at a time, the batch is what provides the parallelism
+            for max_new_tokens, items in groups.items():
+                logger.info(f"Generating a batch of {len(items)}")
+                try:
+                    results = await asyncio.to_thread(
+                        self._generate_batch, [messages for messages, _ in items], max_new_tokens
+                    )
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
+
+    # The rendered leading system messages that all of the requests share, or "" if there
+    # are none. Context and questions are left out on purpose: they differ from request to
+    # request, and caching them would only push the shared system prompt out of the cache.
+    def _shared_prefix(self, batch: list[list[dict]], texts: list[str]) -> str:
+        first = batch[0]
+        count = 0
+        while (count < len(first) - 1 and first[count]["role"] == "system"
+               and all(count < len(messages) - 1 and messages[count] == first[count] for messages in batch)):
+            count += 1
+        if count == 0:
+            return ""
+        prefix = self.tokenizer.apply_chat_template(first[:count], tokenize=False)
+        return prefix if all(text.startswith(prefix) for text in texts) else ""
+
+    def _get_prefix_cache(self, prefix: str):
+        import torch
+
+        if prefix in self._prefix_caches:
+            self._prefix_caches.move_to_end(prefix)
+            return self._prefix_caches[prefix]
+
+        prefix_ids = self.tokenizer(prefix, return_tensors="pt", add_special_tokens=False).input_ids.to(self.model.device)
+        with torch.no_grad():
+            cache = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+        self._prefix_caches[prefix] = (prefix_ids, cache)
+        if len(self._prefix_caches) > self.prefix_cache_size:
+            self._prefix_caches.popitem(last=False)
+        return prefix_ids, cache
+
+    def _generate_batch(self, batch: list[list[dict]], max_new_tokens: int) -> list[str]:
+        import torch
+
+        texts = [
+            self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            for messages in batch
+        ]
+        prefix = self._shared_prefix(batch, texts)
+        suffixes = [text[len(prefix):] for text in texts]
+
+        inputs = self.tokenizer(suffixes, return_tensors="pt", padding=True, add_special_tokens=False).to(self.model.device)
+        input_ids = inputs.input_ids
+        attention_mask = inputs.attention_mask
+        generate_args = {}
+
+        if prefix and self.prefix_cache_size > 0:
+            prefix_ids, cache = self._get_prefix_cache(prefix)
+            batch_size = len(suffixes)
+            # The padding ends up between the shared prefix and each prompt's own tokens. The
+            # attention mask hides it, and the position ids are derived from the mask, so
+            # the prompt tokens still get the positions they would have without padding.
+            input_ids = torch.cat([prefix_ids.expand(batch_size, -1), input_ids], dim=1)
+            attention_mask = torch.cat([torch.ones_like(prefix_ids).expand(batch_size, -1), attention_mask], dim=1)
+            # generate() extends the cache in place, so each call works on its own copy
+            past_key_values = copy.deepcopy(cache)
+            if batch_size > 1:
+                past_key_values.batch_repeat_interleave(batch_size)
+            generate_args["past_key_values"] = past_key_values
+        elif prefix:
+            inputs = self.tokenizer([prefix + suffix for suffix in suffixes], return_tensors="pt", padding=True, add_special_tokens=False).to(self.model.device)
+            input_ids = inputs.input_ids
+            attention_mask = inputs.attention_mask
+
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **generate_args,
+            )
+        return self.tokenizer.batch_decode(output[:, input_ids.shape[1]:], skip_special_tokens=True)
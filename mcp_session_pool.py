@@ -0,0 +1,212 @@
+import asyncio
+import itertools
+import logging
+from datetime import timedelta
+from typing import Any
+
+import mcp.types as types
+from mcp import ClientSession, StdioServerParameters
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+logger = logging.getLogger("mcp-session-pool")
+
+# A pool of warm MCP client sessions to one server, for callers that make many tool calls
+# and don't want to pay for a subprocess spawn and initialize handshake each time.
+#
+# Example:
+#   async with McpSessionPool(StdioServerParameters(command="python", args=["rhdh_catalog_server.py"])) as pool:
+#       tools = await pool.list_tools()
+#       results = await asyncio.gather(*[pool.call_tool("get_apis", arguments) for arguments in many])
+#
+# Each session is owned by its own task, because the MCP transports are anyio context managers
+# that have to be entered and exited from the same task.
+class _PooledSession:
+    def __init__(self, index: int):
+        self.index = index
+        self.session: ClientSession | None = None
+        self.ready = asyncio.Event()
+        self.closing = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.error: BaseException | None = None
+        self.inflight = 0
+        self.replacing = False
+
+class McpSessionPool:
+    def __init__(
+        self,
+        server: StdioServerParameters | str,
+        transport: str | None = None,
+        size: int = 2,
+        headers: dict[str, str] | None = None,
+        read_timeout: float | None = 60,
+        retries: int = 1,
+    ):
+        # server is either the parameters for a stdio subprocess, or the URL of a server
+        # running with --transport sse (the /sse endpoint) or --transport http (the /mcp endpoint)
+        if transport is None:
+            transport = "stdio" if isinstance(server, StdioServerParameters) else "sse"
+        if transport not in ("stdio", "sse", "http"):
+            raise ValueError(f"Unknown transport: {transport}")
+        if (transport == "stdio") != isinstance(server, StdioServerParameters):
+            raise ValueError(f"Transport '{transport}' does not match server {server!r}")
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.server = server
+        self.transport = transport
+        self.size = size
+        self.headers = headers
+        self.read_timeout = timedelta(seconds=read_timeout) if read_timeout else None
+        self.retries = retries
+
+        self._slots: list[_PooledSession] = []
+        self._indexes = itertools.count()
+        self._lock = asyncio.Lock()
+        self._replacements: set[asyncio.Task] = set()
+        self._tools: types.ListToolsResult | None = None
+        self._prompts: types.ListPromptsResult | None = None
+
+    async def __aenter__(self) -> "McpSessionPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        logger.info(f"Opening {self.size} {self.transport} session(s)")
+        slots = await asyncio.gather(
+            *[self._open_slot() for _ in range(self.size)], return_exceptions=True
+        )
+        self._slots = [slot for slot in slots if isinstance(slot, _PooledSession)]
+        errors = [slot for slot in slots if isinstance(slot, BaseException)]
+        if errors:
+            await self.close()
+            raise errors[0]
+
+    async def close(self) -> None:
+        slots, self._slots = self._slots, []
+        for task in self._replacements:
+            task.cancel()
+        for slot in slots:
+            slot.closing.set()
+        await asyncio.gather(*[slot.task for slot in slots if slot.task], return_exceptions=True)
+
+    # Cached, since the tool and prompt lists of these servers don't change while they run.
+    # A reconnect clears the cache in case the server was restarted with different tools.
+    async def list_tools(self) -> types.ListToolsResult:
+        if self._tools is None:
+            self._tools = await self._call("list_tools")
+        return self._tools
+
+    async def list_prompts(self) -> types.ListPromptsResult:
+        if self._prompts is None:
+            self._prompts = await self._call("list_prompts")
+        return self._prompts
+
+    async def get_prompt(
+        self, name: str, arguments: dict[str, str] | None = None
+    ) -> types.GetPromptResult:
+        return await self._call("get_prompt", name, arguments)
+
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any] | None = None
+    ) -> types.CallToolResult:
+        return await self._call("call_tool", name, arguments)
+
+    async def _call(self, method: str, *args):
+        last_error: BaseException | None = None
+        for attempt in range(self.retries + 1):
+            slot = await self._acquire()
+            slot.inflight += 1
+            try:
+                return await getattr(slot.session, method)(*args)
+            except Exception as e:
+                # An McpError means the server answered with an error, so the session itself
+                # is fine, unless it's the SDK failing the requests in flight because the
+                # connection closed
+                if isinstance(e, McpError) and e.error.code != CONNECTION_CLOSED:
+                    raise
+                logger.warning(f"{method} failed on session {slot.index} (attempt {attempt + 1}): {e!r}")
+                last_error = e
+                await self._reconnect(slot)
+            finally:
+                slot.inflight -= 1
+        raise last_error
+
+    # Concurrent requests are multiplexed over the sessions, since a ClientSession can have
+    # many requests in flight at once. Pick the live session with the fewest in flight.
+    # Sessions that have ended are replaced in the background, so the pool doesn't shrink,
+    # and only waited for when there is no live session left.
+    async def _acquire(self) -> _PooledSession:
+        if not self._slots:
+            raise RuntimeError("The session pool is not started")
+        live = [slot for slot in self._slots if slot.session is not None]
+        for slot in self._slots:
+            if slot.session is None and not slot.replacing and live:
+                slot.replacing = True
+                task = asyncio.create_task(self._replace_in_background(slot))
+                self._replacements.add(task)
+                task.add_done_callback(self._replacements.discard)
+        if live:
+            return min(live, key=lambda slot: slot.inflight)
+        slot = self._slots[0]
+        await self._reconnect(slot)
+        return self._slots[0]
+
+    async def _replace_in_background(self, slot: _PooledSession) -> None:
+        try:
+            await self._reconnect(slot)
+        except Exception as e:
+            logger.warning(f"Could not replace session {slot.index}: {e!r}")
+        finally:
+            slot.replacing = False
+
+    async def _reconnect(self, slot: _PooledSession) -> None:
+        async with self._lock:
+            # Another caller may have already replaced this session
+            if slot not in self._slots:
+                return
+            self._tools = None
+            self._prompts = None
+            slot.closing.set()
+            replacement = await self._open_slot()
+            self._slots[self._slots.index(slot)] = replacement
+            logger.info(f"Replaced session {slot.index} with session {replacement.index}")
+
+    async def _open_slot(self) -> _PooledSession:
+        slot = _PooledSession(next(self._indexes))
+        slot.task = asyncio.create_task(self._run_slot(slot))
+        await slot.ready.wait()
+        if slot.session is None:
+            raise ConnectionError(f"Could not open MCP session: {slot.error!r}") from slot.error
+        return slot
+
+    async def _run_slot(self, slot: _PooledSession) -> None:
+        try:
+            async with self._connect() as streams:
+                async with ClientSession(
+                    streams[0], streams[1], read_timeout_seconds=self.read_timeout
+                ) as session:
+                    await session.initialize()
+                    slot.session = session
+                    slot.ready.set()
+                    await slot.closing.wait()
+        except Exception as e:
+            logger.warning(f"Session {slot.index} ended with an error: {e!r}")
+            slot.error = e
+        finally:
+            slot.session = None
+            slot.ready.set()
+
+    def _connect(self):
+        if self.transport == "stdio":
+            from mcp.client.stdio import stdio_client
+            return stdio_client(self.server)
+        elif self.transport == "sse":
+            from mcp.client.sse import sse_client
+            return sse_client(self.server, headers=self.headers)
+        else:
+            from mcp.client.streamable_http import streamablehttp_client
+            return streamablehttp_client(self.server, headers=self.headers)
@@ -4,7 +4,7 @@ from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
 # If this was a purely MCP test client I wouldn't need these
-import ollama
+# (ollama is imported on first use, it's slow to import)
 import timeit
 import re
 
@@ -30,6 +30,7 @@ def extract_url(string):
 
 # Utility method to call the local granite model
 async def call_granite_on_ollama(prompt) -> str:
+    import ollama
     start = timeit.default_timer()
     response = ollama.chat(model='granite3-dense:8b', messages=[
     {
@@ -1,9 +1,16 @@
 import anyio
+import asyncio
 import click
+import contextlib
 import httpx
+import json
 import logging
+import time
+import typing
+import weakref
 import mcp.types as types
 from mcp.server import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("rhdh-catalog-server")
@@ -17,6 +24,37 @@ API_URI             = "/entities/by-name/api/default/ollama-service-api"
 QUERY_URI           = "/entities/by-query"
 ENTITY_FACETS_URI   = "/entity-facets"
 DEFAULT_NS          = "default"
+PAGE_LIMIT          = 500
+
+# The entity fields used by the list tools and the search index
+ENTITY_FIELDS       = "kind,metadata.namespace,metadata.name,metadata.title,metadata.description,metadata.tags,metadata.links"
+
+# How often search_catalog checks the catalog for changes, in seconds
+SEARCH_REFRESH_SECONDS = 60
+
+# How long get_facets and get_tags results are cached, in seconds
+FACETS_CACHE_SECONDS = 60
+# and how many different facet queries are kept at most
+FACETS_CACHE_SIZE = 256
+
+# get_facets accepts these short names for the usual facets
+FACET_ALIASES = {
+    "tags":         "metadata.tags",
+    "namespace":    "metadata.namespace",
+    "type":         "spec.type",
+    "owner":        "spec.owner",
+    "lifecycle":    "spec.lifecycle",
+}
+DEFAULT_FACETS = ["kind", "metadata.tags", "spec.type", "spec.owner", "spec.lifecycle"]
+
+# (url, apiKey, facets, kinds) -> (expiry time, response text), oldest first
+facets_cache = {}
+
+# Set by main when the server is started with --embedding-model
+embedding_model = None
+
+# One search index per Developer Hub url and apiKey, since the apiKey decides what is visible
+search_indexes = {}
 
 # This is a method whose purpose is to make sure HTTP in general is working
 async def fetch_website(
@@ -44,29 +82,444 @@ async def get_from_backstage_catalog(
         response = await client.get(fullPath)
         response.raise_for_status()
         return [types.TextContent(type="text", text=response.text)]
-    
+
+# This is a utility method to get every entity matching a Backstage catalog filter, following
+# the pagination cursor, as parsed JSON. The cursor carries the filter but not the fields,
+# so the fields are sent with every page.
+async def get_all_from_backstage_catalog(
+    url: str, apiKey: str, fields: str, filter: str | None = None
+) -> list[dict]:
+    from urllib.parse import urlencode
+
+    headers = {
+        "User-Agent": "MCP Test Server (github.com/modelcontextprotocol/python-sdk)",
+        "Authorization": f"Bearer {apiKey}"
+    }
+    items = []
+    params = {"fields": fields, "limit": PAGE_LIMIT}
+    if filter:
+        params["filter"] = filter
+    path = BASE_URI + QUERY_URI + "?" + urlencode(params)
+    async with httpx.AsyncClient(follow_redirects=True, headers=headers) as client:
+        while True:
+            response = await client.get(url + path)
+            response.raise_for_status()
+            page = response.json()
+            items.extend(page.get("items", []))
+            cursor = page.get("pageInfo", {}).get("nextCursor")
+            if not cursor:
+                return items
+            path = BASE_URI + QUERY_URI + "?" + urlencode({"cursor": cursor, "fields": fields, "limit": PAGE_LIMIT})
+
+# Gets the counts for several facets in one entity-facets request, optionally limited to some
+# kinds, and caches the response for FACETS_CACHE_SECONDS. Developer Hub computes the counts
+# on every request, so dashboard-style callers asking for the same facets again don't pay for it.
+async def get_facets_from_backstage_catalog(
+    url: str, apiKey: str, facets: list[str], kinds: list[str] | None = None
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    from urllib.parse import urlencode
+
+    facets = sorted({FACET_ALIASES.get(facet, facet) for facet in facets})
+    kinds = sorted({kind.lower() for kind in kinds or []})
+    key = (url, apiKey, tuple(facets), tuple(kinds))
+    cached = facets_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return [types.TextContent(type="text", text=cached[1])]
+
+    # Each filter parameter is ORed with the others, so this matches any of the kinds
+    params = [("facet", facet) for facet in facets] + [("filter", f"kind={kind}") for kind in kinds]
+    path = BASE_URI + ENTITY_FACETS_URI + "?" + urlencode(params)
+    result = await get_from_backstage_catalog(url, path, apiKey)
+    now = time.monotonic()
+    facets_cache.pop(key, None)
+    facets_cache[key] = (now + FACETS_CACHE_SECONDS, result[0].text)
+    # Every entry lives for the same time, so the expired ones are all at the front. Callers
+    # can ask for any combination of facets and kinds, so the number of entries is bounded too.
+    while True:
+        oldest = next(iter(facets_cache))
+        if facets_cache[oldest][0] > now and len(facets_cache) <= FACETS_CACHE_SIZE:
+            break
+        del facets_cache[oldest]
+    return result
+
+# Turns texts into vectors with the --embedding-model, served by the local ollama server
+def embed_with_ollama(texts: list[str]) -> list[list[float]]:
+    import ollama
+    return ollama.embed(model=embedding_model, input=texts)["embeddings"]
+
+# Search the catalog with a local index, see catalog_search.py. The index is refreshed
+# from the catalog at most every SEARCH_REFRESH_SECONDS, and only the entities that
+# changed are reindexed. A refresh runs in the background while queries are answered from
+# the index as it is, so only the very first query for a catalog waits for the fetch.
+async def refresh_search_index(url: str, apiKey: str, state: dict) -> None:
+    entities = await get_all_from_backstage_catalog(url, apiKey, ENTITY_FIELDS)
+    # Embedding the changed entities can take a while, so keep it off the event loop. The
+    # changes are then applied on the event loop, where the searches run, in one go.
+    prepared = await asyncio.to_thread(state["index"].prepare_update, entities)
+    state["index"].apply_update(prepared)
+    state["refreshed"] = time.monotonic()
+
+def log_refresh_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Refreshing the search index failed: {task.exception()!r}")
+
+async def search_catalog(
+    url: str, apiKey: str, query: str, kinds: list[str] | None, limit: int
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    from catalog_search import CatalogSearchIndex
+
+    key = (url, apiKey)
+    if key not in search_indexes:
+        embed = embed_with_ollama if embedding_model else None
+        search_indexes[key] = {"index": CatalogSearchIndex(embed), "refresh": None, "refreshed": 0}
+    state = search_indexes[key]
+
+    refresh = state["refresh"]
+    if (refresh is None or refresh.done()) and time.monotonic() - state["refreshed"] > SEARCH_REFRESH_SECONDS:
+        refresh = state["refresh"] = asyncio.create_task(refresh_search_index(url, apiKey, state))
+        refresh.add_done_callback(log_refresh_failure)
+    if not state["refreshed"]:
+        await asyncio.shield(refresh)
+
+    index = state["index"]
+    query_vector = None
+    if index.embed is not None:
+        query_vector = (await asyncio.to_thread(index.embed, [query]))[0]
+    results = index.search(query, limit, kinds, query_vector)
+
+    return [types.TextContent(type="text", text=json.dumps(
+        [{"score": round(score, 4), **entity} for score, entity in results]
+    ))]
+
+# The catalog queries that are served as resources, see catalog_resources.py
+RESOURCES = {
+    "catalog://apis": (
+        "apis",
+        "The APIs registered in Developer Hub",
+        BASE_URI + QUERY_URI + "?filter=kind=api&fields=" + ENTITY_FIELDS,
+    ),
+    "catalog://inference-servers": (
+        "inference-servers",
+        "The model inference servers registered in Developer Hub",
+        BASE_URI + QUERY_URI + "?filter=kind=component,spec.type=model-server&fields=" + ENTITY_FIELDS,
+    ),
+    "catalog://tags": (
+        "tags",
+        "The tags used by resources in Developer Hub, and how many times each one is used",
+        BASE_URI + ENTITY_FACETS_URI + "?facet=metadata.tags&filter=kind%3Dresource",
+    ),
+}
+
+# The SDK always reports resources.subscribe as false, so turn it on when the catalog
+# watcher is running
+class CatalogServer(Server):
+    resources_subscribe = False
+
+    def get_capabilities(self, notification_options, experimental_capabilities):
+        capabilities = super().get_capabilities(notification_options, experimental_capabilities)
+        if self.resources_subscribe and capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+# The tool schemas never change, so build them once instead of on every list_tools call
+TOOLS = [
+    types.Tool(
+        name="fetch",
+        description="Fetches a webpage and returns its content",
+        inputSchema={
+            "type": "object",
+            "required": ["url"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                }
+            },
+        },
+    ),
+    types.Tool(
+        name="fetch_many",
+        description="Fetches many webpages concurrently, for example to check the links in Developer Hub, and returns the status and content of each one",
+        inputSchema={
+            "type": "object",
+            "required": ["urls"],
+            "properties": {
+                "urls": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "URLs to fetch",
+                },
+                "maxBytes": {
+                    "type": "integer",
+                    "description": "Stop reading each page after this many bytes, defaults to 1000000. Use 0 to only check the status",
+                },
+                "contentTypes": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only read pages whose content type starts with one of these, for example text/html",
+                },
+                "extractText": {
+                    "type": "boolean",
+                    "description": "Return the visible text of HTML pages instead of the HTML",
+                },
+                "perHostConcurrency": {
+                    "type": "integer",
+                    "description": "The most requests to have open to one host at once, defaults to 4",
+                },
+                "perHostRate": {
+                    "type": "number",
+                    "description": "The most requests to start per second to one host, defaults to no limit",
+                },
+                "timeout": {
+                    "type": "number",
+                    "description": "Timeout in seconds for each request, defaults to 10",
+                }
+            },
+        },
+    ),
+    types.Tool(
+        name="get_tags",
+        description="Gets metadata about the tags in Developer Hub: the name of each tag (value), and the number of times each tag is used (count).",
+        inputSchema={
+            "type": "object",
+            "required": ["url","apiKey"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                },
+                "apiKey": {
+                    "type": "string",
+                    "description": "API key to use in the Authorization: Bearer header",
+                }
+            },
+        },
+    ),
+    types.Tool(
+        name="get_facets",
+        description="Gets how many entities in Developer Hub have each value of several facets at once, for example tags, type, owner, lifecycle and kind, optionally only for some kinds of entity.",
+        inputSchema={
+            "type": "object",
+            "required": ["url","apiKey"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                },
+                "apiKey": {
+                    "type": "string",
+                    "description": "API key to use in the Authorization: Bearer header",
+                },
+                "facets": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The entity fields to count, for example tags, type, owner, lifecycle, kind or metadata.namespace. Defaults to kind, tags, type, owner and lifecycle",
+                },
+                "kinds": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only count entities of these kinds, for example api, component or resource. Defaults to all kinds",
+                }
+            },
+        },
+    ),
+    types.Tool(
+        name="get_apis",
+        description="Gets a list of APIs registered in Developer Hub",
+        inputSchema={
+            "type": "object",
+            "required": ["url","apiKey"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                },
+                "apiKey": {
+                    "type": "string",
+                    "description": "API key to use in the Authorization: Bearer header",
+                }
+            },
+        },
+    ),
+    types.Tool(
+        name="get_inference_servers",
+        description="Gets a list of model inference servers registered in Developer Hub",
+        inputSchema={
+            "type": "object",
+            "required": ["url","apiKey"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                },
+                "apiKey": {
+                    "type": "string",
+                    "description": "API key to use in the Authorization: Bearer header",
+                }
+            },
+        },
+    ),
+    types.Tool(
+        name="search_catalog",
+        description="Searches the entities registered in Developer Hub by name, title, description, tags and link titles, and returns the best matches with their score",
+        inputSchema={
+            "type": "object",
+            "required": ["url","apiKey","query"],
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "URL to fetch",
+                },
+                "apiKey": {
+                    "type": "string",
+                    "description": "API key to use in the Authorization: Bearer header",
+                },
+                "query": {
+                    "type": "string",
+                    "description": "What to search for, for example: which service handles model sign-up?",
+                },
+                "kinds": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only return entities of these kinds, for example api or component",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "The most entities to return, defaults to 5",
+                }
+            },
+        },
+    )
+]
+
 @click.group()
 def cli():
     pass
 
 @cli.command()
-@click.option("--port", default=8000, help="Port to listen on for SSE")
+@click.option("--port", default=8000, help="Port to listen on for SSE or HTTP")
 @click.option(
     "--transport",
-    type=click.Choice(["stdio", "sse"]),
+    type=click.Choice(["stdio", "sse", "http"]),
     default="stdio",
     help="Transport type",
 )
-def main(port: int, transport: str) -> int:
-    app = Server("rhdh-api")
+@click.option(
+    "--stateless",
+    is_flag=True,
+    default=False,
+    help="For the http transport, don't keep any session state between requests",
+)
+@click.option(
+    "--json-response",
+    is_flag=True,
+    default=False,
+    help="For the http transport, return plain JSON responses instead of SSE streams",
+)
+@click.option(
+    "--rhdh-url",
+    envvar="RHDH_API_URL",
+    default=None,
+    help="Developer Hub URL to serve the catalog resources from, defaults to $RHDH_API_URL",
+)
+@click.option(
+    "--rhdh-api-key",
+    envvar="RHDH_API_KEY",
+    default=None,
+    help="API key for the catalog resources, defaults to $RHDH_API_KEY",
+)
+@click.option("--poll-interval", default=30.0, help="How often to check subscribed catalog resources for changes, in seconds")
+@click.option(
+    "--embedding-model",
+    "embedding_model_name",
+    default=None,
+    help="An ollama embedding model, for example granite-embedding, to add semantic matching to search_catalog",
+)
+def main(port: int, transport: str, stateless: bool, json_response: bool, rhdh_url: str | None,
+         rhdh_api_key: str | None, poll_interval: float, embedding_model_name: str | None) -> int:
+    global embedding_model
+    embedding_model = embedding_model_name
+    app = CatalogServer("rhdh-api")
     logger.info(f"Starting up rhdh-api server using transport: {transport}")
 
+    # The catalog resources need a Developer Hub to read from, since resources don't take arguments
+    watcher = None
+    if rhdh_url and rhdh_api_key:
+        from catalog_resources import CatalogWatcher
+
+        async def fetch_catalog(path: str) -> str:
+            return (await get_from_backstage_catalog(rhdh_url, path, rhdh_api_key))[0].text
+
+        watcher = CatalogWatcher(RESOURCES, fetch_catalog, poll_interval)
+        app.resources_subscribe = True
+    else:
+        logger.info("No Developer Hub URL and API key were given, so there are no catalog resources")
+
+    @app.list_resources()
+    async def list_resources() -> list[types.Resource]:
+        return watcher.list_resources() if watcher else []
+
+    @app.read_resource()
+    async def read_resource(uri) -> list[ReadResourceContents]:
+        if watcher is None:
+            raise ValueError(f"Unknown resource: {uri}")
+        text = await watcher.read(str(uri))
+        return [ReadResourceContents(content=text, mime_type="application/json")]
+
+    @app.subscribe_resource()
+    async def subscribe_resource(uri) -> None:
+        if watcher is None:
+            raise ValueError(f"Unknown resource: {uri}")
+        watcher.subscribe(str(uri), app.request_context.session)
+
+    @app.unsubscribe_resource()
+    async def unsubscribe_resource(uri) -> None:
+        if watcher is None:
+            raise ValueError(f"Unknown resource: {uri}")
+        watcher.unsubscribe(str(uri), app.request_context.session)
+
+    # Runs the one poll loop for all of the sessions while the server is up
+    @contextlib.asynccontextmanager
+    async def run_watcher():
+        if watcher is None:
+            yield
+            return
+        task = asyncio.create_task(watcher.run())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    # Lets Developer Hub, or anything else that knows the catalog changed, ask for a check
+    # sooner than the next poll. The watcher polls at most once every few seconds however
+    # often this is called, so it can't be used to hammer the catalog.
+    async def handle_webhook(request):
+        from starlette.responses import Response
+        watcher.trigger()
+        return Response(status_code=202)
+
+    # The logging/setLevel level of each session. Sessions go away without telling us, so
+    # don't keep them alive.
+    log_levels = weakref.WeakKeyDictionary()
+
+    @app.set_logging_level()
+    async def set_logging_level(level: types.LoggingLevel) -> None:
+        log_levels[app.request_context.session] = level
+
+    def wants_log(session, level: types.LoggingLevel) -> bool:
+        levels = typing.get_args(types.LoggingLevel)
+        return levels.index(level) >= levels.index(log_levels.get(session, "debug"))
+
     @app.call_tool()
     async def call_tool(
         name: str, arguments: dict
     ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
         
-        # All of the tools require the url
+        # fetch_many takes a list of urls instead
+        if name == "fetch_many":
+            return await fetch_many_websites(arguments)
+
+        # All of the other tools require the url
         if "url" not in arguments:
             raise ValueError("Missing required argument 'url'")
         elif (arguments["url"] == None or arguments["url"] == ""):
@@ -82,91 +535,75 @@ def main(port: int, transport: str) -> int:
             raise ValueError("Required argument 'apiKey' must not be blank")
 
         elif name == "get_tags":
-            path = BASE_URI + ENTITY_FACETS_URI + "?facet=metadata.tags&filter=kind%3Dresource"
-            return await get_from_backstage_catalog(arguments["url"], path, arguments["apiKey"])
+            return await get_facets_from_backstage_catalog(arguments["url"], arguments["apiKey"], ["metadata.tags"], ["resource"])
+        elif name == "get_facets":
+            return await get_facets_from_backstage_catalog(arguments["url"], arguments["apiKey"],
+                                                           arguments.get("facets") or DEFAULT_FACETS, arguments.get("kinds"))
         elif name == "get_apis":
-            path = BASE_URI + QUERY_URI + "?filter=kind=api&fields=kind,metadata.namespace,metadata.name,metadata.title,metadata.description,metadata.tags,metadata.links";
+            path = BASE_URI + QUERY_URI + "?filter=kind=api&fields=" + ENTITY_FIELDS
             return await get_from_backstage_catalog(arguments["url"], path, arguments["apiKey"])
         elif name == "get_inference_servers":
-            path = BASE_URI + QUERY_URI + "?filter=kind=component,spec.type=model-server&fields=kind,metadata.namespace,metadata.name,metadata.title,metadata.description,metadata.tags,metadata.links";
+            path = BASE_URI + QUERY_URI + "?filter=kind=component,spec.type=model-server&fields=" + ENTITY_FIELDS
             return await get_from_backstage_catalog(arguments["url"], path, arguments["apiKey"])
+        elif name == "search_catalog":
+            if "query" not in arguments:
+                raise ValueError("Missing required argument 'query'")
+            elif (arguments["query"] == None or arguments["query"] == ""):
+                raise ValueError("Required argument 'query' must not be blank")
+            return await search_catalog(arguments["url"], arguments["apiKey"], arguments["query"],
+                                        arguments.get("kinds"), int(arguments.get("limit") or 5))
         else:
             raise ValueError(f'Unknown tool: {name}')
 
+    # Fetches the urls concurrently. The url, status and any error of each result are sent to
+    # the client as a log message as soon as it's complete, with a progress notification if
+    # the client asked for progress, and all of the results, with their content, are returned
+    # at the end in the order they completed.
+    async def fetch_many_websites(
+        arguments: dict
+    ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+        from fetch_many import fetch_many
+
+        urls = arguments.get("urls")
+        if not urls:
+            raise ValueError("Missing required argument 'urls'")
+        # fetch_many fetches each url once, so count the results against the distinct urls
+        urls = list(dict.fromkeys(urls))
+        maxBytes = arguments.get("maxBytes")
+
+        ctx = app.request_context
+        progress_token = ctx.meta.progressToken if ctx.meta else None
+        send_logs = wants_log(ctx.session, "info")
+        results = []
+        async for result in fetch_many(
+            urls,
+            per_host_concurrency=int(arguments.get("perHostConcurrency") or 4),
+            per_host_rate=arguments.get("perHostRate"),
+            max_bytes=1_000_000 if maxBytes is None else int(maxBytes),
+            content_types=arguments.get("contentTypes"),
+            extract_text=bool(arguments.get("extractText")),
+            timeout=float(arguments.get("timeout") or 10),
+        ):
+            results.append(result)
+            # Tied to this request, so that over streamable HTTP they go out on the response
+            # stream of this call instead of the session's GET stream
+            if send_logs:
+                summary = {key: result[key] for key in ("url", "status", "error") if key in result}
+                await ctx.session.send_log_message(
+                    level="info", data=summary, logger="fetch_many", related_request_id=ctx.request_id
+                )
+            if progress_token is not None:
+                await ctx.session.send_progress_notification(
+                    progress_token, len(results), len(urls), related_request_id=ctx.request_id
+                )
+        return [types.TextContent(type="text", text=json.dumps(results))]
+
     @app.list_tools()
     async def list_tools() -> list[types.Tool]:
-        return [
-            types.Tool(
-                name="fetch",
-                description="Fetches a webpage and returns its content",
-                inputSchema={
-                    "type": "object",
-                    "required": ["url"],
-                    "properties": {
-                        "url": {
-                            "type": "string",
-                            "description": "URL to fetch",
-                        }
-                    },
-                },
-            ),
-            types.Tool(
-                name="get_tags",
-                description="Gets metadata about the tags in Developer Hub: the name of each tag (value), and the number of times each tag is used (count).",
-                inputSchema={
-                    "type": "object",
-                    "required": ["url","apiKey"],
-                    "properties": {
-                        "url": {
-                            "type": "string",
-                            "description": "URL to fetch",
-                        },
-                        "apiKey": {
-                            "type": "string",
-                            "description": "API key to use in the Authorization: Bearer header",
-                        }
-                    },
-                },
-            ),
-            types.Tool(
-                name="get_apis",
-                description="Gets a list of APIs registered in Developer Hub",
-                inputSchema={
-                    "type": "object",
-                    "required": ["url","apiKey"],
-                    "properties": {
-                        "url": {
-                            "type": "string",
-                            "description": "URL to fetch",
-                        },
-                        "apiKey": {
-                            "type": "string",
-                            "description": "API key to use in the Authorization: Bearer header",
-                        }
-                    },
-                },
-            ),
-            types.Tool(
-                name="get_inference_servers",
-                description="Gets a list of model inference servers registered in Developer Hub",
-                inputSchema={
-                    "type": "object",
-                    "required": ["url","apiKey"],
-                    "properties": {
-                        "url": {
-                            "type": "string",
-                            "description": "URL to fetch",
-                        },
-                        "apiKey": {
-                            "type": "string",
-                            "description": "API key to use in the Authorization: Bearer header",
-                        }
-                    },
-                },
-            )
-        ]
+        return TOOLS
 
     if transport == "sse":
+        from collections.abc import AsyncIterator
         from mcp.server.sse import SseServerTransport
         from starlette.applications import Starlette
         from starlette.routing import Route
@@ -185,12 +622,65 @@ def main(port: int, transport: str) -> int:
         async def handle_messages(request):
             await sse.handle_post_message(request.scope, request.receive, request._send)
 
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app: Starlette) -> AsyncIterator[None]:
+            async with run_watcher():
+                yield
+
+        routes = [
+            Route("/sse", endpoint=handle_sse),
+            Route("/messages", endpoint=handle_messages, methods=["POST"]),
+        ]
+        if watcher:
+            routes.append(Route("/webhook", endpoint=handle_webhook, methods=["POST"]))
+
+        starlette_app = Starlette(
+            debug=True,
+            routes=routes,
+            lifespan=lifespan,
+        )
+
+        import uvicorn
+
+        uvicorn.run(starlette_app, host="0.0.0.0", port=port)
+    elif transport == "http":
+        from collections.abc import AsyncIterator
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+        from starlette.applications import Starlette
+        from starlette.routing import Mount
+        from starlette.types import Receive, Scope, Send
+        logger.info(f"Starting up streamable http server on port: {port} (stateless: {stateless})")
+
+        # In stateless mode every request gets a fresh transport, so any replica
+        # can answer any request and no sticky routing is needed.
+        session_manager = StreamableHTTPSessionManager(
+            app=app,
+            event_store=None,
+            json_response=json_response,
+            stateless=stateless,
+        )
+
+        async def handle_streamable_http(
+            scope: Scope, receive: Receive, send: Send
+        ) -> None:
+            await session_manager.handle_request(scope, receive, send)
+
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app: Starlette) -> AsyncIterator[None]:
+            async with session_manager.run(), run_watcher():
+                yield
+
+        routes = [
+            Mount("/mcp", app=handle_streamable_http),
+        ]
+        if watcher:
+            from starlette.routing import Route
+            routes.append(Route("/webhook", endpoint=handle_webhook, methods=["POST"]))
+
         starlette_app = Starlette(
             debug=True,
-            routes=[
-                Route("/sse", endpoint=handle_sse),
-                Route("/messages", endpoint=handle_messages, methods=["POST"]),
-            ],
+            routes=routes,
+            lifespan=lifespan,
         )
 
         import uvicorn
@@ -201,7 +691,7 @@ def main(port: int, transport: str) -> int:
         logger.info("Starting up stdio server")
 
         async def arun():
-            async with stdio_server() as streams:
+            async with stdio_server() as streams, run_watcher():
                 await app.run(
                     streams[0], streams[1], app.create_initialization_options()
                 )
@@ -211,5 +701,4 @@ def main(port: int, transport: str) -> int:
     return 0
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mcp")
+
+import mcp.types as types
+import rhdh_catalog_server
+
+@pytest.fixture
+def requests(monkeypatch):
+    requests = []
+
+    async def get_from_backstage_catalog(url, path, apiKey):
+        requests.append(path)
+        return [types.TextContent(type="text", text=path)]
+
+    monkeypatch.setattr(rhdh_catalog_server, "get_from_backstage_catalog", get_from_backstage_catalog)
+    monkeypatch.setattr(rhdh_catalog_server, "facets_cache", {})
+    return requests
+
+def get_facets(*facets):
+    return asyncio.run(rhdh_catalog_server.get_facets_from_backstage_catalog("http://rhdh", "key", list(facets)))
+
+def test_facets_are_served_from_the_cache(requests):
+    first = get_facets("tags", "type")
+    assert get_facets("spec.type", "metadata.tags") == first
+    assert len(requests) == 1
+
+def test_the_facets_cache_is_bounded(requests, monkeypatch):
+    monkeypatch.setattr(rhdh_catalog_server, "FACETS_CACHE_SIZE", 3)
+    for facet in ["a", "b", "c", "d", "e"]:
+        get_facets(facet)
+    assert [key[2] for key in rhdh_catalog_server.facets_cache] == [("c",), ("d",), ("e",)]
+
+def test_expired_facets_are_evicted(requests, monkeypatch):
+    get_facets("a")
+    get_facets("b")
+    now = rhdh_catalog_server.time.monotonic() + rhdh_catalog_server.FACETS_CACHE_SECONDS + 1
+    monkeypatch.setattr(rhdh_catalog_server.time, "monotonic", lambda: now)
+    get_facets("c")
+    assert [key[2] for key in rhdh_catalog_server.facets_cache] == [("c",)]
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mcp")
+
+from catalog_resources import CatalogWatcher
+
+URI = "catalog://apis"
+RESOURCES = {URI: ("apis", "The APIs", "/api/catalog/entities/by-query?filter=kind=api")}
+
+class Catalog:
+    def __init__(self, text="v1"):
+        self.text = text
+        self.fetches = 0
+
+    async def fetch(self, path):
+        self.fetches += 1
+        return self.text
+
+class Session:
+    def __init__(self, fail=False):
+        self.updated = []
+        self.fail = fail
+
+    async def send_resource_updated(self, uri):
+        if self.fail:
+            raise ConnectionError("the client went away")
+        self.updated.append(str(uri))
+
+def test_a_change_is_notified_even_if_a_read_saw_it_first():
+    async def run():
+        catalog = Catalog()
+        watcher = CatalogWatcher(RESOURCES, catalog.fetch, interval=0)
+        session = Session()
+        watcher.subscribe(URI, session)
+        await watcher.poll()
+        catalog.text = "v2"
+        assert await watcher.read(URI) == "v2"
+        await watcher.poll()
+        return session.updated
+
+    assert asyncio.run(run()) == [URI]
+
+def test_nothing_is_notified_when_nothing_changed():
+    async def run():
+        catalog = Catalog()
+        watcher = CatalogWatcher(RESOURCES, catalog.fetch)
+        session = Session()
+        watcher.subscribe(URI, session)
+        await watcher.poll()
+        await watcher.poll()
+        return session.updated
+
+    assert asyncio.run(run()) == []
+
+def test_subscribing_after_a_read_notifies_changes_from_that_content():
+    async def run():
+        catalog = Catalog()
+        watcher = CatalogWatcher(RESOURCES, catalog.fetch)
+        await watcher.read(URI)
+        session = Session()
+        watcher.subscribe(URI, session)
+        catalog.text = "v2"
+        await watcher.poll()
+        return session.updated
+
+    assert asyncio.run(run()) == [URI]
+
+def test_recent_reads_are_served_from_the_last_poll():
+    async def run():
+        catalog = Catalog()
+        watcher = CatalogWatcher(RESOURCES, catalog.fetch, interval=60)
+        # Subscribers are held weakly, so keep this one alive
+        session = Session()
+        watcher.subscribe(URI, session)
+        await watcher.poll()
+        catalog.text = "v2"
+        return await watcher.read(URI), catalog.fetches
+
+    assert asyncio.run(run()) == ("v1", 1)
+
+def test_failing_subscribers_are_dropped():
+    async def run():
+        catalog = Catalog()
+        watcher = CatalogWatcher(RESOURCES, catalog.fetch)
+        gone, live = Session(fail=True), Session()
+        watcher.subscribe(URI, gone)
+        watcher.subscribe(URI, live)
+        await watcher.poll()
+        catalog.text = "v2"
+        await watcher.poll()
+        return live.updated, list(watcher._subscribers[URI])
+
+    updated, subscribers = asyncio.run(run())
+    assert updated == [URI]
+    assert len(subscribers) == 1
+
+def test_unknown_resources_are_rejected():
+    watcher = CatalogWatcher(RESOURCES, Catalog().fetch)
+    with pytest.raises(ValueError):
+        watcher.subscribe("catalog://nope", Session())
+
+def test_triggers_are_spaced_by_min_interval():
+    async def run():
+        catalog = Catalog()
+        watcher = CatalogWatcher(RESOURCES, catalog.fetch, interval=60, min_interval=0.1)
+        session = Session()
+        watcher.subscribe(URI, session)
+        task = asyncio.create_task(watcher.run())
+        try:
+            for _ in range(50):
+                watcher.trigger()
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+        return catalog.fetches
+
+    # Half a second of triggers every 10ms is at most one poll per 100ms, plus the first one
+    assert 2 <= asyncio.run(run()) <= 7
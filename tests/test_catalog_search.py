@@ -0,0 +1,139 @@
+import asyncio
+import functools
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from catalog_search import CatalogSearchIndex
+
+def entity(name, description="", kind="Component", tags=()):
+    return {"kind": kind, "metadata": {"name": name, "description": description, "tags": list(tags)}}
+
+CATALOG = [
+    entity("model-signup", "Handles sign-up for the model service", tags=["models"]),
+    entity("billing", "Invoices and payments"),
+    entity("granite-api", "The Granite inference API", kind="API"),
+]
+
+def names(results):
+    return [result["metadata"]["name"] for _, result in results]
+
+def test_search_ranks_matching_entities_and_filters_by_kind():
+    index = CatalogSearchIndex()
+    assert index.update(CATALOG) == (3, 0, 0)
+    assert names(index.search("sign up model", limit=1)) == ["model-signup"]
+    assert names(index.search("invoices")) == ["billing"]
+    assert names(index.search("granite", kinds=["component"])) == []
+    assert index.search("nothing matches this") == []
+
+def test_misspelled_terms_match_by_trigrams():
+    index = CatalogSearchIndex()
+    index.update(CATALOG)
+    assert names(index.search("invoises")) == ["billing"]
+
+def test_update_only_reindexes_what_changed():
+    index = CatalogSearchIndex()
+    index.update(CATALOG)
+    assert index.update(CATALOG) == (0, 0, 0)
+    changed = [entity("billing", "Refunds"), CATALOG[2], entity("new-service")]
+    assert index.update(changed) == (1, 1, 1)
+    assert len(index) == 3
+    assert names(index.search("refunds")) == ["billing"]
+    assert index.search("invoices") == []
+
+def test_removed_terms_leave_nothing_behind():
+    index = CatalogSearchIndex()
+    index.update(CATALOG)
+    index.update([])
+    assert len(index) == 0
+    assert index._postings == {}
+    assert index._doc_freqs == {}
+    assert index._trigrams == {}
+
+def test_a_failed_embedding_is_retried_on_the_next_update():
+    pytest.importorskip("numpy")
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        if len(calls) == 1:
+            raise ConnectionError("ollama is not running")
+        return [[1.0, float(i)] for i in range(len(texts))]
+
+    index = CatalogSearchIndex(embed)
+    with pytest.raises(ConnectionError):
+        index.update(CATALOG)
+    assert len(index) == 0
+    assert index.update(CATALOG) == (3, 0, 0)
+    assert calls == [3, 3]
+    assert names(index.search("invoices", query_vector=[1.0, 1.0]))[0] == "billing"
+
+def test_prepare_update_leaves_the_index_alone():
+    index = CatalogSearchIndex()
+    index.update(CATALOG[:1])
+    prepared = index.prepare_update(CATALOG[1:])
+    assert names(index.search("signup")) == ["model-signup"]
+    index.apply_update(prepared)
+    assert index.search("signup") == []
+    assert len(index) == 2
+
+def test_every_catalog_page_asks_for_the_fields(monkeypatch):
+    pytest.importorskip("mcp")
+    import httpx
+    import rhdh_catalog_server
+
+    requests = []
+
+    def handler(request):
+        query = parse_qs(urlparse(str(request.url)).query)
+        requests.append(query)
+        if "cursor" not in query:
+            return httpx.Response(200, json={"items": [{"n": 1}], "pageInfo": {"nextCursor": "page2"}})
+        return httpx.Response(200, json={"items": [{"n": 2}], "pageInfo": {}})
+
+    monkeypatch.setattr(rhdh_catalog_server.httpx, "AsyncClient",
+                        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    items = asyncio.run(rhdh_catalog_server.get_all_from_backstage_catalog(
+        "http://rhdh", "key", "kind,metadata.name", filter="kind=api"))
+
+    assert items == [{"n": 1}, {"n": 2}]
+    assert len(requests) == 2
+    assert all(query["fields"] == ["kind,metadata.name"] for query in requests)
+    assert requests[0]["filter"] == ["kind=api"]
+    assert requests[1]["cursor"] == ["page2"]
+
+def test_queries_are_answered_while_the_index_refreshes(monkeypatch):
+    pytest.importorskip("mcp")
+    import rhdh_catalog_server
+
+    fetched = []
+    release = None
+
+    async def get_all(url, apiKey, fields, filter=None):
+        fetched.append(url)
+        if len(fetched) > 1:
+            await release.wait()
+            return CATALOG
+        return CATALOG[:1]
+
+    monkeypatch.setattr(rhdh_catalog_server, "get_all_from_backstage_catalog", get_all)
+    monkeypatch.setattr(rhdh_catalog_server, "search_indexes", {})
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        first = await rhdh_catalog_server.search_catalog("http://rhdh", "key", "signup", None, 5)
+        # The index is stale, so this query starts a refresh that can't finish yet
+        rhdh_catalog_server.search_indexes[("http://rhdh", "key")]["refreshed"] -= rhdh_catalog_server.SEARCH_REFRESH_SECONDS + 1
+        second = await asyncio.wait_for(
+            rhdh_catalog_server.search_catalog("http://rhdh", "key", "invoices", None, 5), 1)
+        release.set()
+        await rhdh_catalog_server.search_indexes[("http://rhdh", "key")]["refresh"]
+        third = await rhdh_catalog_server.search_catalog("http://rhdh", "key", "invoices", None, 5)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert "model-signup" in first[0].text
+    assert second[0].text == "[]"
+    assert "billing" in third[0].text
+    assert len(fetched) == 2
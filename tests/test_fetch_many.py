@@ -0,0 +1,81 @@
+import asyncio
+import functools
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from fetch_many import HostLimiter, fetch_many, html_to_text
+
+PAGES = {
+    "/big": ("text/plain", b"x" * 5000),
+    "/page": ("text/html; charset=utf-8", b"<html><head><title>T</title></head><body><p>Hello</p><script>x()</script><p>world</p></body></html>"),
+    "/image": ("image/png", b"\x89PNG"),
+}
+
+@pytest.fixture
+def requested(monkeypatch):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        if request.url.path not in PAGES:
+            return httpx.Response(404)
+        content_type, body = PAGES[request.url.path]
+        return httpx.Response(200, content=body, headers={"content-type": content_type})
+
+    monkeypatch.setattr(httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    return requested
+
+def fetch(urls, **kwargs):
+    async def run():
+        return {result["url"]: result async for result in fetch_many(urls, **kwargs)}
+    return asyncio.run(run())
+
+def test_bodies_are_truncated_at_max_bytes(requested):
+    results = fetch(["http://a/big", "http://a/page"], max_bytes=100)
+    assert results["http://a/big"]["bytes"] == 100
+    assert results["http://a/big"]["truncated"] is True
+    assert len(results["http://a/big"]["text"]) == 100
+    assert "truncated" not in results["http://a/page"]
+
+def test_max_bytes_zero_only_checks_the_status(requested):
+    results = fetch(["http://a/big", "http://a/missing"], max_bytes=0)
+    assert results["http://a/big"]["status"] == 200
+    assert results["http://a/big"]["bytes"] == 0
+    assert "text" not in results["http://a/big"]
+    assert results["http://a/missing"]["status"] == 404
+
+def test_other_content_types_are_skipped(requested):
+    results = fetch(["http://a/page", "http://a/image"], content_types=["text/"], extract_text=True)
+    assert results["http://a/image"]["skipped"] == "content type not allowed"
+    assert "text" not in results["http://a/image"]
+    assert results["http://a/page"]["text"] == "Hello\nworld"
+
+def test_each_url_is_fetched_once(requested):
+    results = fetch(["http://a/page", "http://a/page", "http://b/page"])
+    assert set(results) == {"http://a/page", "http://b/page"}
+    assert len(requested) == 2
+
+def test_html_to_text_drops_markup_scripts_and_styles():
+    html = "<style>p {}</style><h1>Title</h1><p>Some   <b>bold</b> text</p><noscript>on</noscript>"
+    assert html_to_text(html) == "Title\nSome bold text"
+
+def test_requests_to_a_host_are_spaced_by_the_rate():
+    async def run():
+        limiter = HostLimiter(concurrency=10, rate=20)
+        loop = asyncio.get_running_loop()
+        starts = {"a": [], "b": []}
+
+        async def start(host):
+            await limiter.wait_turn(host)
+            starts[host].append(loop.time())
+
+        await asyncio.gather(*[start("a") for _ in range(4)], start("b"))
+        return starts
+
+    starts = asyncio.run(run())
+    gaps = [later - earlier for earlier, later in zip(starts["a"], starts["a"][1:])]
+    assert all(gap >= 0.045 for gap in gaps)
+    # Other hosts don't wait for this one
+    assert starts["b"][0] - starts["a"][0] < 0.045
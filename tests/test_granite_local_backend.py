@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from granite_local_backend import GraniteLocalBackend
+
+# Renders messages like a chat template would, without loading a real tokenizer
+class StubTokenizer:
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=False):
+        text = "".join(f"<{message['role']}>{message['content']}<end>" for message in messages)
+        return text + ("<assistant>" if add_generation_prompt else "")
+
+SYSTEM = {"role": "system", "content": "You are a helpful assistant."}
+
+def user(content):
+    return {"role": "user", "content": content}
+
+def backend_with_stub_tokenizer(**kwargs) -> GraniteLocalBackend:
+    backend = GraniteLocalBackend(**kwargs)
+    backend.tokenizer = StubTokenizer()
+    return backend
+
+def shared_prefix(backend, batch):
+    texts = [backend.tokenizer.apply_chat_template(messages, add_generation_prompt=True) for messages in batch]
+    return backend._shared_prefix(batch, texts)
+
+def test_shared_prefix_is_the_system_turn_even_with_different_context():
+    backend = backend_with_stub_tokenizer()
+    batch = [
+        [SYSTEM, user("Here is some relevant context: A"), user("question 1")],
+        [SYSTEM, user("question 2")],
+    ]
+    assert shared_prefix(backend, batch) == "<system>You are a helpful assistant.<end>"
+
+def test_shared_prefix_leaves_out_identical_context():
+    backend = backend_with_stub_tokenizer()
+    batch = [[SYSTEM, user("context"), user("question")]]
+    assert shared_prefix(backend, batch) == "<system>You are a helpful assistant.<end>"
+
+def test_no_shared_prefix_without_a_common_system_turn():
+    backend = backend_with_stub_tokenizer()
+    other_system = {"role": "system", "content": "Be brief."}
+    assert shared_prefix(backend, [[user("question")]]) == ""
+    assert shared_prefix(backend, [[SYSTEM, user("a")], [other_system, user("b")]]) == ""
+    # The last message is the question, never part of the prefix
+    assert shared_prefix(backend, [[SYSTEM]]) == ""
+
+def test_batches_are_grouped_by_max_new_tokens_only():
+    backend = backend_with_stub_tokenizer(max_batch_size=8, max_wait_ms=50)
+    backend.model = object()
+    calls = []
+
+    def generate_batch(batch, max_new_tokens):
+        calls.append((len(batch), max_new_tokens))
+        return [f"{max_new_tokens}:{messages[-1]['content']}" for messages in batch]
+    backend._generate_batch = generate_batch
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                backend.generate([SYSTEM, user("context A"), user("q1")], max_new_tokens=10),
+                backend.generate([SYSTEM, user("context B"), user("q2")], max_new_tokens=10),
+                backend.generate([SYSTEM, user("q3")], max_new_tokens=20),
+            )
+        finally:
+            await backend.close()
+
+    results = asyncio.run(run())
+    assert results == ["10:q1", "10:q2", "20:q3"]
+    assert sorted(calls) == [(1, 20), (2, 10)]
+
+def test_int8_on_a_known_non_cpu_device_fails_before_loading():
+    with pytest.raises(ValueError, match="int8"):
+        GraniteLocalBackend(device="cuda", quantize="int8")
+    GraniteLocalBackend(device="cpu", quantize="int8")
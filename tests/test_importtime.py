@@ -0,0 +1,73 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("mcp")
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The clients spawn these servers for every run, so their startup is paid on every agent
+# session. Most of the import time is the mcp SDK itself (which brings in httpx, anyio,
+# pydantic, starlette and uvicorn), at about 0.5-0.7 seconds; the budgets leave room for
+# slower machines but catch a new heavy import at module level.
+IMPORT_BUDGET_SECONDS = 1.5
+FIRST_LIST_TOOLS_BUDGET_SECONDS = 3.0
+
+# Optional, heavy modules that must only be imported when a feature that needs them is used
+DEFERRED_MODULES = [
+    "torch", "transformers", "numpy", "ollama",
+    "granite_local_backend", "catalog_search", "catalog_resources", "fetch_many",
+]
+
+def import_time_seconds(module: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    )
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1_000_000
+    raise AssertionError(f"No import time reported for {module}:\n{result.stderr}")
+
+def imported_modules(module: str) -> set[str]:
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print(' '.join(sys.modules))"],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    )
+    return set(result.stdout.split())
+
+@pytest.mark.parametrize("module", ["rhdh_catalog_server", "granite3_model_server"])
+def test_server_import_time(module):
+    seconds = import_time_seconds(module)
+    assert seconds < IMPORT_BUDGET_SECONDS, f"Importing {module} took {seconds:.2f}s"
+
+@pytest.mark.parametrize("module", ["rhdh_catalog_server", "granite3_model_server", "rhdh_catalog_client"])
+def test_heavy_modules_are_deferred(module):
+    loaded = imported_modules(module) & set(DEFERRED_MODULES)
+    assert not loaded, f"Importing {module} also imported {sorted(loaded)}"
+
+@pytest.mark.parametrize("script", ["rhdh_catalog_server.py", "granite3_model_server.py"])
+def test_time_to_first_list_tools(script):
+    params = StdioServerParameters(command=sys.executable, args=[os.path.join(REPO_DIR, script)], env=None)
+
+    async def first_list_tools() -> float:
+        start = time.monotonic()
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = await session.list_tools()
+                seconds = time.monotonic() - start
+        assert tools.tools
+        return seconds
+
+    seconds = asyncio.run(first_list_tools())
+    assert seconds < FIRST_LIST_TOOLS_BUDGET_SECONDS, f"The first list_tools from {script} took {seconds:.2f}s"